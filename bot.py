@@ -1,5 +1,8 @@
 """Telegram bot handlers for managing wallets and viewing balances."""
+import asyncio
 import logging
+import time
+from typing import List, Optional, Tuple
 from telegram import Update
 from telegram.ext import (
     Application,
@@ -16,32 +19,45 @@ logger = logging.getLogger(__name__)
 class TelegramBot:
     """Telegram bot for wallet management and balance queries."""
     
-    def __init__(self, db: Database):
+    # Cache lifetimes (seconds) used to absorb bursts of repeated commands
+    TOP_WALLETS_CACHE_TTL = 5.0
+    BALANCE_CACHE_TTL = 15.0
+    
+    def __init__(self, db: Database, helius: HeliusClient):
         """Initialize Telegram bot."""
         self.db = db
+        self.helius = helius
         self.application = None
-    
-    async def start_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Handle /start command."""
-
-        welcome_message = (
+        self._top5_cache: Optional[Tuple[float, List[Tuple[str, float]]]] = None  # (cached_at, top wallets)
+        self._balance_cache: Optional[Tuple[float, int, float]] = None  # (cached_at, wallet count, total)
+        self._balance_refresh: Optional[asyncio.Task] = None  # In-flight /balance refresh shared by callers
+        self._cache_generation = 0  # Bumped whenever the wallet set changes
+        
+        # /start messages are static, so build them once
+        welcome_header = (
             "🤖 *Solana Wallet Balance Bot*\n\n"
             "Available commands:\n"
         )
-        
-        if self._is_admin(update.effective_user.id):
-            welcome_message += (
-                "/add <addr1> <addr2> ... - Add wallet(s) to tracking\n"
-                "/remove <addr1> <addr2> ... - Remove wallet(s) from tracking\n"
-                "/balance - Show total USDT balance (forces update)\n"
-                "/stats - Show overall statistics\n"
-            )
-
-        welcome_message += (
+        admin_commands = (
+            "/add <addr1> <addr2> ... - Add wallet(s) to tracking\n"
+            "/remove <addr1> <addr2> ... - Remove wallet(s) from tracking\n"
+            "/balance - Show total USDT balance (forces update)\n"
+            "/stats - Show overall statistics\n"
+        )
+        common_commands = (
             "/top_5 - List top 5 wallets by USDT balance\n"
             "/enable_pushover <user_key> - Subscribe to Pushover alerts\n"
             "/disable_pushover - Unsubscribe from Pushover alerts"
         )
+        self._welcome_admin = welcome_header + admin_commands + common_commands
+        self._welcome_common = welcome_header + common_commands
+    
+    async def start_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle /start command."""
+        if self._is_admin(update.effective_user.id):
+            welcome_message = self._welcome_admin
+        else:
+            welcome_message = self._welcome_common
         await update.message.reply_text(welcome_message, parse_mode="Markdown")
 
     async def add_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -61,13 +77,17 @@ class TelegramBot:
             return
         
         addresses = context.args
-        added = await self.db.add_wallets(addresses)
+        # Derive ATAs once at insert time so they never need recomputing
+        atas = self.helius.get_ata_addresses(addresses)
+        added = await self.db.add_wallets(addresses, atas)
         
         if added == 0:
             await update.message.reply_text(
                 "ℹ️ All provided addresses are already being tracked."
             )
         else:
+            self._invalidate_caches()
+            self.helius.invalidate_balances(addresses)
             await update.message.reply_text(
                 f"✅ Successfully added {added} wallet(s) to tracking."
             )
@@ -96,6 +116,8 @@ class TelegramBot:
                 "ℹ️ None of the provided addresses were being tracked."
             )
         else:
+            self._invalidate_caches()
+            self.helius.invalidate_balances(addresses)
             await update.message.reply_text(
                 f"✅ Successfully removed {removed} wallet(s) from tracking."
             )
@@ -109,38 +131,67 @@ class TelegramBot:
             )
             return
 
-        await update.message.reply_text("🔄 Fetching latest balances...")
+        if self._balance_cache and time.monotonic() - self._balance_cache[0] < self.BALANCE_CACHE_TTL:
+            _, wallet_count, total = self._balance_cache
+        else:
+            # Concurrent callers share one in-flight refresh instead of each fetching
+            if self._balance_refresh is None or self._balance_refresh.done():
+                self._balance_refresh = asyncio.create_task(self._refresh_balances())
+                await update.message.reply_text("🔄 Fetching latest balances...")
+            
+            result = await asyncio.shield(self._balance_refresh)
+            
+            if result is None:
+                await update.message.reply_text(
+                    "ℹ️ No wallets are being tracked. Use /add to add wallets."
+                )
+                return
+            
+            wallet_count, total = result
         
-        # Get all wallets
+        await update.message.reply_text(
+            f"💰 *Total USDT Balance*\n\n"
+            f"Tracked Wallets: {wallet_count}\n"
+            f"Total Balance: {total:,.2f} USDT",
+            parse_mode="Markdown"
+        )
+    
+    async def _refresh_balances(self) -> Optional[Tuple[int, float]]:
+        """
+        Fetch fresh balances from Helius and store them.
+        
+        Returns:
+            (wallet count, total balance), or None if no wallets are tracked
+        """
+        generation = self._cache_generation
         wallets = await self.db.get_all_wallets()
         
         if not wallets:
-            await update.message.reply_text(
-                "ℹ️ No wallets are being tracked. Use /add to add wallets."
-            )
-            return
+            return None
         
-        # Fetch fresh balances from Helius
-        async with HeliusClient() as helius:
-            balances = await helius.get_multiple_balances(wallets)
+        # Fetch fresh balances from Helius (/balance forces an update, so skip its cache)
+        balances = await self.helius.get_multiple_balances(wallets, use_cache=False)
         
         # Update database
-        for address, balance in balances.items():
-            await self.db.update_balance(address, balance)
+        await self.db.update_balances_bulk(list(balances.items()))
         
         # Calculate total
-        total = sum(balances.values())
+        total = await self.db.get_total_balance()
+        wallet_count = len(wallets)
+        # Don't cache a result for a wallet set that changed while fetching
+        if generation == self._cache_generation:
+            self._balance_cache = (time.monotonic(), wallet_count, total)
+        self._top5_cache = None
         
-        await update.message.reply_text(
-            f"💰 *Total USDT Balance*\n\n"
-            f"Tracked Wallets: {len(wallets)}\n"
-            f"Total Balance: {total:,.2f} USDT",
-            parse_mode="Markdown"
-        )
+        return wallet_count, total
     
     async def top_5_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle /top_5 command to show top 5 wallets by balance."""
-        top_wallets = await self.db.get_top_wallets(5)
+        if self._top5_cache and time.monotonic() - self._top5_cache[0] < self.TOP_WALLETS_CACHE_TTL:
+            top_wallets = self._top5_cache[1]
+        else:
+            top_wallets = await self.db.get_top_wallets(5)
+            self._top5_cache = (time.monotonic(), top_wallets)
         
         if not top_wallets:
             await update.message.reply_text(
@@ -200,13 +251,15 @@ class TelegramBot:
     
     def setup_handlers(self, application: Application):
         """Set up command handlers."""
+        # I/O-heavy handlers use block=False so they run as independent tasks
+        # and don't hold up cheap commands; /balance fetches are single-flight.
         application.add_handler(CommandHandler("start", self.start_command))
-        application.add_handler(CommandHandler("add", self.add_command))
-        application.add_handler(CommandHandler("remove", self.remove_command))
-        application.add_handler(CommandHandler("balance", self.balance_command))
+        application.add_handler(CommandHandler("add", self.add_command, block=False))
+        application.add_handler(CommandHandler("remove", self.remove_command, block=False))
+        application.add_handler(CommandHandler("balance", self.balance_command, block=False))
         application.add_handler(CommandHandler("top_5", self.top_5_command))
         application.add_handler(CommandHandler("stats", self.stats_command))
-        application.add_handler(CommandHandler("enable_pushover", self.enable_pushover_command))
+        application.add_handler(CommandHandler("enable_pushover", self.enable_pushover_command, block=False))
         application.add_handler(CommandHandler("disable_pushover", self.disable_pushover_command))
     
     def build_application(self) -> Application:
@@ -219,3 +272,11 @@ class TelegramBot:
     def _is_admin(self, user_id: int) -> bool:
         """Check if a user is an admin."""
         return user_id in Config.ADMIN_USER_IDS
+    
+    def _invalidate_caches(self):
+        """Drop cached /top_5 and /balance results after the wallet set changes."""
+        self._cache_generation += 1
+        self._top5_cache = None
+        self._balance_cache = None
+        # Later /balance calls start a new refresh instead of joining a stale one
+        self._balance_refresh = None
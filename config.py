@@ -35,7 +35,7 @@ class Config:
     USDT_MINT = "Es9vMFrzaCERmJfrF4H2FYD4KCoNkY11McCe8BenwNYB"
 
     # Admin user IDs (comma-separated)
-    ADMIN_USER_IDS = set(int(uid.strip()) for uid in os.getenv("ADMIN_USER_IDS", "").split(",") if uid.strip())
+    ADMIN_USER_IDS = frozenset(int(uid.strip()) for uid in os.getenv("ADMIN_USER_IDS", "").split(",") if uid.strip())
     
     @classmethod
     def validate(cls):
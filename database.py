@@ -1,38 +1,199 @@
 """Database module for managing wallets, balances, and Pushover subscriptions."""
+import asyncio
 import aiosqlite
+import logging
 from datetime import datetime
-from typing import List, Optional, Tuple
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 from config import Config
 
+logger = logging.getLogger(__name__)
+
+# SQL statements are module-level constants so sqlite3's statement cache
+# reuses the prepared statement on every call.
+_SQL_INSERT_WALLET = "INSERT OR IGNORE INTO tracked_wallets (address, ata) VALUES (?, ?)"
+_SQL_INIT_BALANCE = "INSERT OR IGNORE INTO balances (address, amount, last_updated) VALUES (?, 0, ?)"
+_SQL_SELECT_WALLETS = "SELECT address FROM tracked_wallets"
+_SQL_SELECT_WALLETS_WITH_ATA = "SELECT address, ata FROM tracked_wallets"
+_SQL_SELECT_WALLETS_WITHOUT_ATA = "SELECT address FROM tracked_wallets WHERE ata IS NULL"
+_SQL_UPDATE_WALLET_ATA = "UPDATE tracked_wallets SET ata = ? WHERE address = ?"
+# Wallets removed while their balance was being fetched are skipped
+_SQL_UPSERT_BALANCE = """
+    INSERT INTO balances (address, amount, last_updated)
+    SELECT ?1, ?2, ?3
+    WHERE EXISTS (SELECT 1 FROM tracked_wallets WHERE address = ?1)
+    ON CONFLICT(address) DO UPDATE SET
+        amount = excluded.amount,
+        last_updated = excluded.last_updated
+"""
+_SQL_SELECT_BALANCE = "SELECT amount FROM balances WHERE address = ?"
+_SQL_SELECT_ALL_BALANCES = "SELECT address, amount FROM balances ORDER BY amount DESC"
+_SQL_SELECT_TOTAL_BALANCE = "SELECT SUM(amount) FROM balances"
+_SQL_SELECT_TOP_WALLETS = "SELECT address, amount FROM balances ORDER BY amount DESC LIMIT ?"
+_SQL_UPSERT_PUSHOVER_SUBSCRIPTION = """
+    INSERT INTO pushover_subscriptions (user_id, user_key)
+    VALUES (?, ?)
+    ON CONFLICT(user_id) DO UPDATE SET
+        user_key = excluded.user_key
+"""
+_SQL_DELETE_PUSHOVER_SUBSCRIPTION = "DELETE FROM pushover_subscriptions WHERE user_id = ?"
+_SQL_SELECT_PUSHOVER_SUBSCRIPTIONS = "SELECT user_id, user_key FROM pushover_subscriptions"
+
 
 class Database:
     """Async database handler using aiosqlite."""
     
+    # Maximum number of queued writes committed together in one transaction
+    WRITE_BATCH_SIZE = 100
+    
     def __init__(self, db_path: str = None):
         """Initialize database handler."""
         self.db_path = db_path or Config.DATABASE_PATH
         self.db: Optional[aiosqlite.Connection] = None
+        # Queue of (sql, params, many, future); None stops the writer
+        self._write_queue: Optional[asyncio.Queue] = None
+        self._writer_task: Optional[asyncio.Task] = None
     
     async def connect(self):
         """Connect to the database and create tables if needed."""
         self.db = await aiosqlite.connect(self.db_path)
+        # WAL + NORMAL avoids an fsync of the main DB file on every commit
+        await self.db.execute("PRAGMA journal_mode=WAL")
+        await self.db.execute("PRAGMA synchronous=NORMAL")
+        await self.db.execute("PRAGMA temp_store=MEMORY")
+        await self.db.execute("PRAGMA cache_size=-20000")
+        await self.db.execute("PRAGMA mmap_size=268435456")
+        await self.db.execute("PRAGMA foreign_keys=ON")
         await self._create_tables()
+        
+        # All writes go through a single writer task that group-commits them
+        self._write_queue = asyncio.Queue()
+        self._writer_task = asyncio.create_task(self._writer())
     
     async def close(self):
         """Close the database connection."""
+        if self._writer_task:
+            # Let the writer flush pending writes before closing
+            await self._write_queue.put(None)
+            await self._writer_task
+            self._writer_task = None
         if self.db:
             await self.db.close()
     
+    async def _writer(self):
+        """Drain the write queue, committing each group of queued writes at once."""
+        batch = []
+        try:
+            running = True
+            while running:
+                batch = [await self._write_queue.get()]
+                # Take whatever else queued up meanwhile, without waiting for more
+                while len(batch) < self.WRITE_BATCH_SIZE and not self._write_queue.empty():
+                    batch.append(self._write_queue.get_nowait())
+                
+                if None in batch:
+                    running = False
+                    batch = [item for item in batch if item is not None]
+                
+                if not batch:
+                    continue
+                
+                try:
+                    await self._commit_batch(batch)
+                except Exception as e:
+                    # Keep the writer alive; only this batch fails
+                    logger.error(f"Error committing write batch: {e}")
+                    for _, _, _, future in batch:
+                        if not future.done():
+                            future.set_exception(e)
+                    try:
+                        await self.db.rollback()
+                    except Exception as rollback_error:
+                        logger.error(f"Error rolling back write batch: {rollback_error}")
+        finally:
+            # Fail anything still pending so callers don't wait forever
+            error = RuntimeError("Database writer stopped")
+            while not self._write_queue.empty():
+                item = self._write_queue.get_nowait()
+                if item is not None:
+                    batch.append(item)
+            for _, _, _, future in batch:
+                if not future.done():
+                    future.set_exception(error)
+    
+    async def _commit_batch(self, batch: List[Tuple[str, Sequence[Any], bool, asyncio.Future]]):
+        """
+        Run a group of queued writes in one transaction and resolve their futures.
+        
+        Each write runs inside its own savepoint, so a failing write is rolled
+        back on its own without affecting the rest of the group.
+        
+        Args:
+            batch: Queued (sql, params, many, future) items
+        """
+        await self.db.execute("BEGIN")
+        
+        results = []
+        for sql, params, many, future in batch:
+            await self.db.execute("SAVEPOINT queued_write")
+            try:
+                if many:
+                    cursor = await self.db.executemany(sql, params)
+                else:
+                    cursor = await self.db.execute(sql, params)
+                rowcount = cursor.rowcount
+                await cursor.close()
+            except Exception as e:
+                await self.db.execute("ROLLBACK TO queued_write")
+                await self.db.execute("RELEASE queued_write")
+                if not future.done():
+                    future.set_exception(e)
+                continue
+            
+            await self.db.execute("RELEASE queued_write")
+            results.append((future, rowcount))
+        
+        await self.db.commit()
+        
+        for future, rowcount in results:
+            if not future.done():
+                future.set_result(rowcount)
+    
+    async def _write(self, sql: str, params: Sequence[Any] = (), many: bool = False) -> int:
+        """
+        Queue a write for the writer task and wait until it is committed.
+        
+        Args:
+            sql: SQL statement
+            params: Statement parameters (a sequence of parameter tuples if many)
+            many: Use executemany instead of execute
+            
+        Returns:
+            Number of rows affected
+        """
+        if not self._writer_task or self._writer_task.done():
+            raise RuntimeError("Database writer is not running")
+        
+        future = asyncio.get_running_loop().create_future()
+        await self._write_queue.put((sql, params, many, future))
+        return await future
+    
     async def _create_tables(self):
         """Create necessary tables if they don't exist."""
         async with self.db.cursor() as cursor:
             # Tracked wallets table
             await cursor.execute("""
                 CREATE TABLE IF NOT EXISTS tracked_wallets (
-                    address TEXT PRIMARY KEY
+                    address TEXT PRIMARY KEY,
+                    ata TEXT
                 )
             """)
             
+            # Add ata column to databases created before it existed
+            await cursor.execute("PRAGMA table_info(tracked_wallets)")
+            columns = [row[1] for row in await cursor.fetchall()]
+            if "ata" not in columns:
+                await cursor.execute("ALTER TABLE tracked_wallets ADD COLUMN ata TEXT")
+            
             # Balances table
             await cursor.execute("""
                 CREATE TABLE IF NOT EXISTS balances (
@@ -44,6 +205,11 @@ class Database:
                 )
             """)
             
+            # Index for top wallets queries (ORDER BY amount DESC LIMIT ?)
+            await cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_balances_amount ON balances(amount DESC)"
+            )
+            
             # Pushover subscriptions table
             await cursor.execute("""
                 CREATE TABLE IF NOT EXISTS pushover_subscriptions (
@@ -55,125 +221,104 @@ class Database:
             await self.db.commit()
     
     # Wallet management
-    async def add_wallets(self, addresses: List[str]) -> int:
-        """Add multiple wallet addresses to tracked_wallets."""
-        async with self.db.cursor() as cursor:
-            added = 0
-            for address in addresses:
-                try:
-                    await cursor.execute(
-                        "INSERT INTO tracked_wallets (address) VALUES (?)",
-                        (address,)
-                    )
-                    # Initialize balance entry
-                    await cursor.execute(
-                        "INSERT INTO balances (address, amount, last_updated) VALUES (?, 0, ?)",
-                        (address, datetime.now())
-                    )
-                    added += 1
-                except aiosqlite.IntegrityError:
-                    # Address already exists, skip
-                    pass
-            await self.db.commit()
-            return added
+    async def add_wallets(self, addresses: List[str], atas: Optional[Dict[str, str]] = None) -> int:
+        """Add multiple wallet addresses (with their derived ATAs) to tracked_wallets."""
+        atas = atas or {}
+        now = datetime.now()
+        added, _ = await asyncio.gather(
+            # Already tracked addresses are skipped by OR IGNORE
+            self._write(
+                _SQL_INSERT_WALLET,
+                [(address, atas.get(address) or None) for address in addresses],
+                many=True
+            ),
+            # Initialize balance entries
+            self._write(
+                _SQL_INIT_BALANCE,
+                [(address, now) for address in addresses],
+                many=True
+            ),
+        )
+        return added
     
     async def remove_wallets(self, addresses: List[str]) -> int:
         """Remove wallet addresses from tracked_wallets."""
-        async with self.db.cursor() as cursor:
-            removed = 0
-            for address in addresses:
-                # Remove from balances first
-                await cursor.execute("DELETE FROM balances WHERE address = ?", (address,))
-                # Remove from tracked_wallets
-                result = await cursor.execute(
-                    "DELETE FROM tracked_wallets WHERE address = ?",
-                    (address,)
-                )
-                removed += result.rowcount
-            await self.db.commit()
-            return removed
+        if not addresses:
+            return 0
+        # Balances are removed via ON DELETE CASCADE
+        placeholders = ",".join("?" * len(addresses))
+        return await self._write(
+            f"DELETE FROM tracked_wallets WHERE address IN ({placeholders})",
+            addresses
+        )
     
     async def get_all_wallets(self) -> List[str]:
         """Get all tracked wallet addresses."""
-        async with self.db.cursor() as cursor:
-            await cursor.execute("SELECT address FROM tracked_wallets")
-            rows = await cursor.fetchall()
-            return [row[0] for row in rows]
+        rows = await self.db.execute_fetchall(_SQL_SELECT_WALLETS)
+        return [row[0] for row in rows]
+    
+    async def get_all_wallets_with_ata(self) -> List[Tuple[str, Optional[str]]]:
+        """Get all tracked wallet addresses with their stored ATAs."""
+        return list(await self.db.execute_fetchall(_SQL_SELECT_WALLETS_WITH_ATA))
+    
+    async def get_wallets_without_ata(self) -> List[str]:
+        """Get tracked wallet addresses that have no stored ATA yet."""
+        rows = await self.db.execute_fetchall(_SQL_SELECT_WALLETS_WITHOUT_ATA)
+        return [row[0] for row in rows]
+    
+    async def update_wallet_atas(self, atas: Dict[str, str]) -> int:
+        """Store derived ATAs for already tracked wallets."""
+        if not atas:
+            return 0
+        return await self._write(
+            _SQL_UPDATE_WALLET_ATA,
+            [(ata, address) for address, ata in atas.items()],
+            many=True
+        )
     
     # Balance management
     async def update_balance(self, address: str, amount: float):
         """Update balance for a specific wallet."""
-        async with self.db.cursor() as cursor:
-            await cursor.execute("""
-                INSERT INTO balances (address, amount, last_updated)
-                VALUES (?, ?, ?)
-                ON CONFLICT(address) DO UPDATE SET
-                    amount = excluded.amount,
-                    last_updated = excluded.last_updated
-            """, (address, amount, datetime.now()))
-            await self.db.commit()
+        await self._write(_SQL_UPSERT_BALANCE, (address, amount, datetime.now()))
+    
+    async def update_balances_bulk(self, items: List[Tuple[str, float]]):
+        """Update balances for multiple wallets in a single transaction."""
+        now = datetime.now()
+        await self._write(
+            _SQL_UPSERT_BALANCE,
+            [(address, amount, now) for address, amount in items],
+            many=True
+        )
     
     async def get_balance(self, address: str) -> Optional[float]:
         """Get balance for a specific wallet."""
-        async with self.db.cursor() as cursor:
-            await cursor.execute(
-                "SELECT amount FROM balances WHERE address = ?",
-                (address,)
-            )
-            row = await cursor.fetchone()
-            return row[0] if row else None
+        rows = await self.db.execute_fetchall(_SQL_SELECT_BALANCE, (address,))
+        return rows[0][0] if rows else None
     
     async def get_all_balances(self) -> List[Tuple[str, float]]:
         """Get all wallet balances."""
-        async with self.db.cursor() as cursor:
-            await cursor.execute("""
-                SELECT address, amount FROM balances
-                ORDER BY amount DESC
-            """)
-            return await cursor.fetchall()
+        return list(await self.db.execute_fetchall(_SQL_SELECT_ALL_BALANCES))
     
     async def get_total_balance(self) -> float:
         """Get the sum of all wallet balances."""
-        async with self.db.cursor() as cursor:
-            await cursor.execute("SELECT SUM(amount) FROM balances")
-            row = await cursor.fetchone()
-            return row[0] if row and row[0] else 0.0
+        rows = await self.db.execute_fetchall(_SQL_SELECT_TOTAL_BALANCE)
+        return rows[0][0] if rows and rows[0][0] else 0.0
     
     async def get_top_wallets(self, limit: int = 5) -> List[Tuple[str, float]]:
         """Get top N wallets by balance."""
-        async with self.db.cursor() as cursor:
-            await cursor.execute("""
-                SELECT address, amount FROM balances
-                ORDER BY amount DESC
-                LIMIT ?
-            """, (limit,))
-            return await cursor.fetchall()
+        return list(await self.db.execute_fetchall(_SQL_SELECT_TOP_WALLETS, (limit,)))
     
     # Pushover subscriptions
     async def add_pushover_subscription(self, user_id: str, user_key: str) -> bool:
         """Add or update a Pushover subscription."""
-        async with self.db.cursor() as cursor:
-            await cursor.execute("""
-                INSERT INTO pushover_subscriptions (user_id, user_key)
-                VALUES (?, ?)
-                ON CONFLICT(user_id) DO UPDATE SET
-                    user_key = excluded.user_key
-            """, (user_id, user_key))
-            await self.db.commit()
-            return True
+        await self._write(_SQL_UPSERT_PUSHOVER_SUBSCRIPTION, (user_id, user_key))
+        return True
     
     async def remove_pushover_subscription(self, user_id: str) -> bool:
         """Remove a Pushover subscription."""
-        async with self.db.cursor() as cursor:
-            result = await cursor.execute(
-                "DELETE FROM pushover_subscriptions WHERE user_id = ?",
-                (user_id,)
-            )
-            await self.db.commit()
-            return result.rowcount > 0
+        removed = await self._write(_SQL_DELETE_PUSHOVER_SUBSCRIPTION, (user_id,))
+        return removed > 0
     
     async def get_all_pushover_subscriptions(self) -> List[Tuple[str, str]]:
         """Get all Pushover subscriptions (user_id, user_key)."""
-        async with self.db.cursor() as cursor:
-            await cursor.execute("SELECT user_id, user_key FROM pushover_subscriptions")
-            return await cursor.fetchall()
+        return list(await self.db.execute_fetchall(_SQL_SELECT_PUSHOVER_SUBSCRIPTIONS))
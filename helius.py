@@ -4,7 +4,10 @@ import base64
 import struct
 import httpx
 import logging
-from typing import Optional, Dict, List
+import orjson
+import time
+from collections import deque
+from typing import Deque, Optional, Dict, List, Tuple
 from solders.pubkey import Pubkey
 from spl.token.instructions import get_associated_token_address
 from config import Config
@@ -22,31 +25,107 @@ class HeliusClient:
     # Batch size for getMultipleAccounts (Solana limit is 100)
     BATCH_SIZE = 100
     
+    # Payloads are serialized with orjson, so the content type is set explicitly
+    JSON_HEADERS = {"content-type": "application/json"}
+    
+    # SPL Token account layout:
+    # - Bytes 0-31: mint (32 bytes)
+    # - Bytes 32-63: owner (32 bytes)
+    # - Bytes 64-71: amount (uint64, little-endian)
+    # - ...more fields
+    # Only the amount field is requested via dataSlice.
+    AMOUNT_OFFSET = 64
+    AMOUNT_LENGTH = 8
+    
+    # Placeholder amount for missing or malformed token accounts
+    _ZERO_AMOUNT = bytes(AMOUNT_LENGTH)
+    
+    # getMultipleAccounts config, identical for every batch
+    _ACCOUNTS_CONFIG = {
+        "encoding": "base64",
+        "commitment": "confirmed",
+        "dataSlice": {"offset": AMOUNT_OFFSET, "length": AMOUNT_LENGTH},
+    }
+    
     def __init__(self):
         """Initialize Helius client."""
         self.rpc_url = Config.HELIUS_RPC_URL
         self.usdt_mint = Pubkey.from_string(Config.USDT_MINT)
         self.client: Optional[httpx.AsyncClient] = None
         self._request_id = 0
-        self._rate_limiter = asyncio.Semaphore(self.RATE_LIMIT_REQUESTS)
-        self._rate_limit_reset_time = 0
+        # Sliding window: start times of the last RATE_LIMIT_REQUESTS requests
+        self._request_times: Deque[float] = deque(maxlen=self.RATE_LIMIT_REQUESTS)
+        self._rate_lock = asyncio.Lock()
+        self._in_flight = asyncio.Semaphore(self.RATE_LIMIT_REQUESTS)
         self._ata_cache: Dict[str, str] = {}  # Cache for Associated Token Addresses
+        # Recently fetched balances: wallet -> (balance, expires_at)
+        self._balance_cache: Dict[str, Tuple[float, float]] = {}
+        self.balance_cache_ttl = max(Config.SYNC_INTERVAL / 2, 10.0)
+    
+    async def connect(self):
+        """Open the HTTP client. The connection pool is kept for the client's lifetime."""
+        # HTTP/2 multiplexes concurrent batch requests over one kept-alive connection;
+        # the transport retries failed connection attempts
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(30.0, connect=5.0),
+            transport=httpx.AsyncHTTPTransport(
+                http2=True,
+                retries=2,
+                limits=httpx.Limits(
+                    max_connections=20,
+                    max_keepalive_connections=20,
+                    keepalive_expiry=300.0,
+                ),
+            ),
+        )
+    
+    async def warm_up(self):
+        """Open a connection to the RPC host ahead of the first request (DNS + TLS)."""
+        if not self.client:
+            raise RuntimeError("Client not initialized. Call connect() or use async context manager.")
+        
+        try:
+            await self.client.head(self.rpc_url)
+        except httpx.HTTPError as e:
+            logger.warning(f"Could not pre-warm RPC connection: {e}")
+    
+    async def close(self):
+        """Close the HTTP client."""
+        if self.client:
+            await self.client.aclose()
+            self.client = None
     
     async def __aenter__(self):
         """Async context manager entry."""
-        self.client = httpx.AsyncClient(timeout=30.0)
+        await self.connect()
         return self
     
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         """Async context manager exit."""
-        if self.client:
-            await self.client.aclose()
+        await self.close()
     
     def _get_next_id(self) -> int:
         """Get next request ID."""
         self._request_id += 1
         return self._request_id
     
+    async def _wait_for_rate_limit(self):
+        """
+        Wait until another request fits in the rate limit and record it.
+        
+        A request may start only once the request RATE_LIMIT_REQUESTS before it
+        is at least RATE_LIMIT_PERIOD old, so no window of that length ever
+        holds more than RATE_LIMIT_REQUESTS requests.
+        """
+        loop = asyncio.get_running_loop()
+        
+        async with self._rate_lock:
+            if len(self._request_times) == self.RATE_LIMIT_REQUESTS:
+                wait_time = self._request_times[0] + self.RATE_LIMIT_PERIOD - loop.time()
+                if wait_time > 0:
+                    await asyncio.sleep(wait_time)
+            self._request_times.append(loop.time())
+    
     async def _rate_limited_request(self, payload: dict) -> dict:
         """
         Make a rate-limited request to the RPC.
@@ -55,28 +134,31 @@ class HeliusClient:
             payload: JSON-RPC payload
             
         Returns:
-            Response JSON
+            Response JSON (with an "error" entry if the HTTP status is an error)
         """
         if not self.client:
-            raise RuntimeError("Client not initialized. Use async context manager.")
-        
-        async with self._rate_limiter:
-            # Check if we need to wait for rate limit reset
-            current_time = asyncio.get_event_loop().time()
-            if current_time < self._rate_limit_reset_time:
-                wait_time = self._rate_limit_reset_time - current_time
-                await asyncio.sleep(wait_time)
-            
-            # Update rate limit reset time
-            self._rate_limit_reset_time = asyncio.get_event_loop().time() + (self.RATE_LIMIT_PERIOD / self.RATE_LIMIT_REQUESTS)
-            
+            raise RuntimeError("Client not initialized. Call connect() or use async context manager.")
+        
+        # Take the in-flight slot first so the recorded start time is the real send time
+        async with self._in_flight:
+            await self._wait_for_rate_limit()
             try:
-                response = await self.client.post(self.rpc_url, json=payload)
-                response.raise_for_status()
-                return response.json()
-            except httpx.HTTPError as e:
-                logger.error(f"HTTP error in RPC request: {e}")
+                response = await self.client.post(
+                    self.rpc_url,
+                    content=orjson.dumps(payload),
+                    headers=self.JSON_HEADERS,
+                )
+            except httpx.TransportError as e:
+                logger.error(f"Transport error in RPC request: {e}")
                 raise
+        
+        logger.debug("RPC response over %s", response.http_version)
+        
+        # HTTP errors are reported as a JSON-RPC error instead of raising
+        if response.status_code >= 400:
+            return {"error": {"code": response.status_code, "message": response.reason_phrase}}
+        
+        return orjson.loads(response.content)
     
     def _get_ata_address(self, wallet_address: str) -> str:
         """
@@ -101,41 +183,125 @@ class HeliusClient:
             logger.error(f"Error deriving ATA for {wallet_address}: {e}")
             return ""
     
-    def _parse_token_account(self, account_data: Optional[dict]) -> float:
+    def get_ata_addresses(self, wallet_addresses: List[str]) -> Dict[str, str]:
         """
-        Parse token account data using fast binary parsing.
+        Derive Associated Token Addresses for multiple wallets.
         
         Args:
-            account_data: Account data from getMultipleAccounts
+            wallet_addresses: List of Solana wallet addresses
             
         Returns:
-            USDT balance as float
+            Dictionary mapping wallet address to ATA (empty string if invalid)
         """
-        if not account_data or "data" not in account_data:
-            return 0.0
+        return {wallet: self._get_ata_address(wallet) for wallet in wallet_addresses}
+    
+    def preload_ata_cache(self, wallets_with_ata: List[Tuple[str, Optional[str]]]):
+        """
+        Populate the ATA cache with previously derived addresses.
         
-        try:
-            # Decode base64 data
-            raw_data = base64.b64decode(account_data["data"][0])
+        Args:
+            wallets_with_ata: List of (wallet address, ATA) pairs; entries
+                without an ATA are skipped and derived on first use
+        """
+        self._ata_cache.update(
+            (wallet, ata) for wallet, ata in wallets_with_ata if ata
+        )
+    
+    def _parse_token_accounts(self, accounts: List[Optional[dict]]) -> List[float]:
+        """
+        Parse a batch of token accounts using fast binary parsing.
+        
+        Accounts are requested with a dataSlice covering only the amount
+        field, so each account's data is the 8-byte amount. These are gathered
+        into one buffer and decoded with a single struct.unpack call.
+        
+        Args:
+            accounts: Account data list from getMultipleAccounts (sliced)
             
-            # SPL Token account layout:
-            # - Bytes 0-31: mint (32 bytes)
-            # - Bytes 32-63: owner (32 bytes)
-            # - Bytes 64-71: amount (uint64, little-endian)
-            # - ...more fields
+        Returns:
+            USDT balance for each account (0.0 for missing/invalid accounts)
+        """
+        amounts = bytearray()
+        for account_data in accounts:
+            amount = b""
+            if account_data and "data" in account_data:
+                try:
+                    amount = base64.b64decode(account_data["data"][0])
+                except Exception as e:
+                    logger.warning(f"Error parsing token account data: {e}")
+            amounts += amount if len(amount) == self.AMOUNT_LENGTH else self._ZERO_AMOUNT
+        
+        # USDT has 6 decimals
+        return [
+            amount_raw / 1_000_000
+            for amount_raw in struct.unpack(f"<{len(accounts)}Q", amounts)
+        ]
+    
+    def _build_payload(self, batch: List[str]) -> dict:
+        """
+        Build a getMultipleAccounts payload for a batch of ATAs.
+        
+        Args:
+            batch: List of Associated Token Addresses (max BATCH_SIZE)
             
-            if len(raw_data) < 72:
-                return 0.0
+        Returns:
+            JSON-RPC payload
+        """
+        return {
+            "jsonrpc": "2.0",
+            "id": self._get_next_id(),
+            "method": "getMultipleAccounts",
+            "params": [
+                batch,
+                self._ACCOUNTS_CONFIG
+            ]
+        }
+    
+    async def _fetch_batches(self, ata_list: List[str]) -> List[Tuple[List[str], list]]:
+        """
+        Fetch token accounts for all ATAs, running batch requests concurrently.
+        
+        Concurrency is bounded by the rate limiter in _rate_limited_request.
+        
+        Args:
+            ata_list: List of Associated Token Addresses
             
-            # Extract amount (8 bytes starting at byte 64)
-            amount_raw = struct.unpack("<Q", raw_data[64:72])[0]
+        Returns:
+            List of (batch, accounts) pairs for every batch that succeeded
+        """
+        batches = [
+            ata_list[i:i + self.BATCH_SIZE]
+            for i in range(0, len(ata_list), self.BATCH_SIZE)
+        ]
+        results = await asyncio.gather(
+            *(self._rate_limited_request(self._build_payload(batch)) for batch in batches),
+            return_exceptions=True
+        )
+        
+        fetched = []
+        for i, (batch, data) in enumerate(zip(batches, results)):
+            start = i * self.BATCH_SIZE
+            if isinstance(data, Exception):
+                logger.error(f"Error fetching batch {start}-{start+len(batch)}: {data}")
+                continue
             
-            # USDT has 6 decimals
-            return amount_raw / 1_000_000
+            if not isinstance(data, dict):
+                logger.error(f"Malformed response in batch {start}-{start+len(batch)}: {data!r}")
+                continue
             
-        except Exception as e:
-            logger.warning(f"Error parsing token account data: {e}")
-            return 0.0
+            if "error" in data:
+                logger.error(f"RPC error in batch {start}-{start+len(batch)}: {data['error']}")
+                continue
+            
+            result = data.get("result") or {}
+            accounts = (result.get("value") or []) if isinstance(result, dict) else None
+            if not isinstance(accounts, list):
+                logger.error(f"Malformed result in batch {start}-{start+len(batch)}: {result!r}")
+                continue
+            
+            fetched.append((batch, accounts))
+        
+        return fetched
     
     async def get_total_usdt_balance(self, wallet_addresses: List[str]) -> float:
         """
@@ -152,12 +318,10 @@ class HeliusClient:
         
         # Derive all ATA addresses
         ata_list = []
-        wallet_to_ata = {}
         for wallet in wallet_addresses:
             ata = self._get_ata_address(wallet)
             if ata:
                 ata_list.append(ata)
-                wallet_to_ata[ata] = wallet
         
         if not ata_list:
             logger.warning("No valid wallet addresses to query")
@@ -165,48 +329,25 @@ class HeliusClient:
         
         total_usdt = 0.0
         
-        # Process in batches of 100 (Solana's getMultipleAccounts limit)
-        for i in range(0, len(ata_list), self.BATCH_SIZE):
-            batch = ata_list[i:i + self.BATCH_SIZE]
-            
-            payload = {
-                "jsonrpc": "2.0",
-                "id": self._get_next_id(),
-                "method": "getMultipleAccounts",
-                "params": [
-                    batch,
-                    {"encoding": "base64", "commitment": "confirmed"}
-                ]
-            }
-            
-            try:
-                data = await self._rate_limited_request(payload)
-                
-                if "error" in data:
-                    logger.error(f"RPC error in batch {i}-{i+len(batch)}: {data['error']}")
-                    continue
-                
-                result = data.get("result", {})
-                accounts = result.get("value", [])
-                
-                # Parse each account
-                for account in accounts:
-                    if account:
-                        balance = self._parse_token_account(account)
-                        total_usdt += balance
-                        
-            except Exception as e:
-                logger.error(f"Error fetching batch {i}-{i+len(batch)}: {e}")
-                continue
+        # Batches of 100 (Solana's getMultipleAccounts limit) are fetched concurrently
+        for _, accounts in await self._fetch_batches(ata_list):
+            total_usdt += sum(self._parse_token_accounts(accounts))
         
         return total_usdt
     
-    async def get_multiple_balances(self, wallet_addresses: List[str]) -> Dict[str, float]:
+    async def get_multiple_balances(
+        self, wallet_addresses: List[str], use_cache: bool = False
+    ) -> Dict[str, float]:
         """
         Get USDT balances for multiple wallet addresses (individual balances).
         
+        Fetched balances are always cached. With use_cache, balances fetched
+        within the last balance_cache_ttl seconds are served from that cache
+        and only the remaining wallets are queried.
+        
         Args:
             wallet_addresses: List of Solana wallet addresses
+            use_cache: Serve recently fetched balances from cache
             
         Returns:
             Dictionary mapping address to balance
@@ -214,59 +355,51 @@ class HeliusClient:
         if not wallet_addresses:
             return {}
         
-        # Derive all ATA addresses
+        balances = {}
+        
+        # Derive ATA addresses for wallets that need fetching
         ata_list = []
-        wallet_to_ata = {}
         ata_to_wallet = {}
         
+        now = time.monotonic()
         for wallet in wallet_addresses:
+            cached = self._balance_cache.get(wallet) if use_cache else None
+            if cached and cached[1] > now:
+                balances[wallet] = cached[0]
+                continue
+            
+            balances[wallet] = 0.0
             ata = self._get_ata_address(wallet)
             if ata:
                 ata_list.append(ata)
-                wallet_to_ata[wallet] = ata
                 ata_to_wallet[ata] = wallet
         
-        balances = {wallet: 0.0 for wallet in wallet_addresses}
+        if not ata_list:
+            return balances
         
-        # Process in batches of 100
-        for i in range(0, len(ata_list), self.BATCH_SIZE):
-            batch = ata_list[i:i + self.BATCH_SIZE]
-            
-            payload = {
-                "jsonrpc": "2.0",
-                "id": self._get_next_id(),
-                "method": "getMultipleAccounts",
-                "params": [
-                    batch,
-                    {"encoding": "base64", "commitment": "confirmed"}
-                ]
-            }
-            
-            try:
-                data = await self._rate_limited_request(payload)
-                
-                if "error" in data:
-                    logger.error(f"RPC error in batch {i}-{i+len(batch)}: {data['error']}")
-                    continue
-                
-                result = data.get("result", {})
-                accounts = result.get("value", [])
-                
-                # Parse each account and map back to wallet address
-                for idx, account in enumerate(accounts):
-                    if account and idx < len(batch):
-                        ata = batch[idx]
-                        wallet = ata_to_wallet.get(ata)
-                        if wallet:
-                            balance = self._parse_token_account(account)
-                            balances[wallet] = balance
-                        
-            except Exception as e:
-                logger.error(f"Error fetching batch {i}-{i+len(batch)}: {e}")
-                continue
+        # Batches of 100 are fetched concurrently
+        fetched = await self._fetch_batches(ata_list)
+        expires_at = time.monotonic() + self.balance_cache_ttl
+        for batch, accounts in fetched:
+            # Parse the whole batch and map back to wallet addresses
+            for ata, balance in zip(batch, self._parse_token_accounts(accounts)):
+                wallet = ata_to_wallet.get(ata)
+                if wallet:
+                    balances[wallet] = balance
+                    self._balance_cache[wallet] = (balance, expires_at)
         
         return balances
     
+    def invalidate_balances(self, wallet_addresses: List[str]):
+        """
+        Drop cached balances, e.g. after wallets are added or removed.
+        
+        Args:
+            wallet_addresses: List of Solana wallet addresses
+        """
+        for wallet in wallet_addresses:
+            self._balance_cache.pop(wallet, None)
+    
     async def get_usdt_balance(self, wallet_address: str) -> float:
         """
         Get USDT balance for a single wallet address.
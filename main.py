@@ -1,7 +1,8 @@
 """Main application entry point with background sync and alert logic."""
 import asyncio
 import logging
-from datetime import datetime
+import time
+from typing import Tuple
 from telegram.ext import Application
 from database import Database
 from helius import HeliusClient
@@ -20,15 +21,34 @@ logger = logging.getLogger(__name__)
 class BalanceMonitor:
     """Monitor wallet balances and send alerts."""
     
-    def __init__(self, db: Database, telegram_app: Application):
+    def __init__(self, db: Database, telegram_app: Application, helius: HeliusClient):
         """Initialize balance monitor."""
         self.db = db
         self.telegram_app = telegram_app
+        self.helius = helius
         self.pushover = PushoverClient()
         self.last_alert_state = None  # Track if we're above or below threshold
         self.running = False
+        
+        # Telegram notification parts that don't change between cycles
+        self._notification_template = (
+            "📊 *Balance Update*\n\n"
+            "🕐 Time: {time}\n"
+            "💼 Tracked Wallets: {wallets}\n"
+            "💰 Total USDT: {balance:,.2f}\n"
+        )
+        self._low_alert_line = f"\n⚠️ *Alert: Balance below {Config.ALERT_THRESHOLD_LOW:,.0f} USDT threshold!*"
+        self._high_alert_line = f"\n🎉 *Alert: Balance exceeds {Config.ALERT_THRESHOLD_HIGH:,.0f} USDT threshold!*"
+    
+    async def start(self):
+        """Open the long-lived Pushover client used for alerts."""
+        await self.pushover.connect()
+    
+    async def close(self):
+        """Close the Pushover client."""
+        await self.pushover.close()
     
-    async def sync_balances(self) -> float:
+    async def sync_balances(self) -> Tuple[float, int]:
         """
         Sync all wallet balances from Helius using optimized batch requests.
         
@@ -36,45 +56,43 @@ class BalanceMonitor:
         and binary parsing for maximum performance. Rate limited to 10 req/s.
         
         Returns:
-            Total USDT balance across all wallets
+            Tuple of (total USDT balance across all wallets, wallet count)
         """
         wallets = await self.db.get_all_wallets()
         
         if not wallets:
             logger.info("No wallets to sync")
-            return 0.0
+            return 0.0, 0
         
         logger.info(f"Syncing balances for {len(wallets)} wallet(s)")
         
         # Fetch balances from Helius using optimized batch requests
         # This uses getMultipleAccounts (100 wallets per request) with binary parsing
-        async with HeliusClient() as helius:
-            balances = await helius.get_multiple_balances(wallets)
+        # Balances fetched moments ago (e.g. by /balance) are reused
+        balances = await self.helius.get_multiple_balances(wallets, use_cache=True)
         
-        # Update database with individual balances
-        for address, balance in balances.items():
-            await self.db.update_balance(address, balance)
+        # Update database with individual balances in one transaction
+        await self.db.update_balances_bulk(list(balances.items()))
         
-        total = sum(balances.values())
+        # Total from the stored balances so it matches what /top_5 and /balance see
+        total = await self.db.get_total_balance()
         logger.info(f"Total USDT balance: {total:,.2f}")
         
-        return total
+        return total, len(wallets)
     
-    async def send_telegram_notification(self, total_balance: float):
+    async def send_telegram_notification(self, total_balance: float, wallet_count: int):
         """Send balance notification to Telegram channel."""
         try:
-            wallet_count = len(await self.db.get_all_wallets())
-            message = (
-                f"📊 *Balance Update*\n\n"
-                f"🕐 Time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
-                f"💼 Tracked Wallets: {wallet_count}\n"
-                f"💰 Total USDT: {total_balance:,.2f}\n"
+            message = self._notification_template.format(
+                time=time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()),
+                wallets=wallet_count,
+                balance=total_balance,
             )
             
             if total_balance < Config.ALERT_THRESHOLD_LOW:
-                message += f"\n⚠️ *Alert: Balance below {Config.ALERT_THRESHOLD_LOW:,.0f} USDT threshold!*"
+                message += self._low_alert_line
             elif total_balance > Config.ALERT_THRESHOLD_HIGH:
-                message += f"\n🎉 *Alert: Balance exceeds {Config.ALERT_THRESHOLD_HIGH:,.0f} USDT threshold!*"
+                message += self._high_alert_line
             
             await self.telegram_app.bot.send_message(
                 chat_id=Config.TELEGRAM_CHANNEL_ID,
@@ -97,36 +115,37 @@ class BalanceMonitor:
         
         # Send alert only when crossing a threshold (state change)
         if current_state != self.last_alert_state:
-            # Get all Pushover subscriptions
-            subscriptions = await self.db.get_all_pushover_subscriptions()
-            
-            if subscriptions:
-                user_keys = [user_key for _, user_key in subscriptions]
+            if current_state == "normal":
+                # Balance returned to normal range (between thresholds); nothing to send
+                if self.last_alert_state is not None:
+                    logger.info(f"Balance returned to normal range: {total_balance:,.2f} USDT")
+            else:
+                # Get all Pushover subscriptions (only needed when an alert is sent)
+                subscriptions = await self.db.get_all_pushover_subscriptions()
                 
-                # Send appropriate alert based on state
-                if current_state == "low":
-                    logger.warning(f"Balance below LOW threshold: {total_balance:,.2f} USDT")
-                    await self.pushover.send_alert(
-                        user_keys=user_keys,
-                        title="⚠️ Low USDT Balance Alert",
-                        message=f"Total balance dropped to {total_balance:,.2f} USDT (below {Config.ALERT_THRESHOLD_LOW:,.0f})",
-                        priority=1
-                    )
-                    logger.info(f"LOW threshold alert sent to {len(user_keys)} subscriber(s)")
+                if subscriptions:
+                    user_keys = [user_key for _, user_key in subscriptions]
                     
-                elif current_state == "high":
-                    logger.warning(f"Balance above HIGH threshold: {total_balance:,.2f} USDT")
-                    await self.pushover.send_alert(
-                        user_keys=user_keys,
-                        title="🎉 High USDT Balance Alert",
-                        message=f"Total balance reached {total_balance:,.2f} USDT (above {Config.ALERT_THRESHOLD_HIGH:,.0f})",
-                        priority=1
-                    )
-                    logger.info(f"HIGH threshold alert sent to {len(user_keys)} subscriber(s)")
-                    
-                elif current_state == "normal" and self.last_alert_state is not None:
-                    # Balance returned to normal range (between thresholds)
-                    logger.info(f"Balance returned to normal range: {total_balance:,.2f} USDT")
+                    # Send appropriate alert based on state
+                    if current_state == "low":
+                        logger.warning(f"Balance below LOW threshold: {total_balance:,.2f} USDT")
+                        await self.pushover.send_alert(
+                            user_keys=user_keys,
+                            title="⚠️ Low USDT Balance Alert",
+                            message=f"Total balance dropped to {total_balance:,.2f} USDT (below {Config.ALERT_THRESHOLD_LOW:,.0f})",
+                            priority=1
+                        )
+                        logger.info(f"LOW threshold alert sent to {len(user_keys)} subscriber(s)")
+                        
+                    elif current_state == "high":
+                        logger.warning(f"Balance above HIGH threshold: {total_balance:,.2f} USDT")
+                        await self.pushover.send_alert(
+                            user_keys=user_keys,
+                            title="🎉 High USDT Balance Alert",
+                            message=f"Total balance reached {total_balance:,.2f} USDT (above {Config.ALERT_THRESHOLD_HIGH:,.0f})",
+                            priority=1
+                        )
+                        logger.info(f"HIGH threshold alert sent to {len(user_keys)} subscriber(s)")
             
             # Update state
             self.last_alert_state = current_state
@@ -139,13 +158,13 @@ class BalanceMonitor:
         while self.running:
             try:
                 # Sync balances
-                total_balance = await self.sync_balances()
+                total_balance, wallet_count = await self.sync_balances()
                 
-                # Send Telegram notification
-                await self.send_telegram_notification(total_balance)
-                
-                # Check alerts
-                await self.check_and_send_alerts(total_balance)
+                # Send Telegram notification and check alerts concurrently
+                await asyncio.gather(
+                    self.send_telegram_notification(total_balance, wallet_count),
+                    self.check_and_send_alerts(total_balance),
+                )
                 
             except Exception as e:
                 logger.error(f"Error in sync loop: {e}", exc_info=True)
@@ -166,36 +185,58 @@ async def main():
         Config.validate()
         logger.info("Configuration validated")
         
-        # Initialize database
+        # Shared Helius client (keeps its connection pool and ATA cache)
         db = Database()
-        await db.connect()
-        logger.info("Database connected")
+        helius = HeliusClient()
         
         # Build Telegram bot
-        telegram_bot = TelegramBot(db)
+        telegram_bot = TelegramBot(db, helius)
         application = telegram_bot.build_application()
-        
-        # Initialize application
-        await application.initialize()
-        await application.start()
-        logger.info("Telegram bot started")
-        
-        # Start polling in the background
-        asyncio.create_task(application.updater.start_polling())
-        
-        # Start balance monitor
-        monitor = BalanceMonitor(db, application)
+        monitor = None
         
         try:
+            await helius.connect()
+            
+            # Database, Helius and Telegram setup are independent, so run them concurrently
+            async with asyncio.TaskGroup() as tg:
+                tg.create_task(db.connect())
+                tg.create_task(helius.warm_up())
+                tg.create_task(application.initialize())
+            logger.info("Database connected")
+            logger.info("Helius client connected")
+            
+            # Derive and store ATAs for wallets added before they were persisted
+            missing_atas = await db.get_wallets_without_ata()
+            if missing_atas:
+                atas = helius.get_ata_addresses(missing_atas)
+                backfilled = await db.update_wallet_atas({wallet: ata for wallet, ata in atas.items() if ata})
+                logger.info(f"Stored ATAs for {backfilled} existing wallet(s)")
+            helius.preload_ata_cache(await db.get_all_wallets_with_ata())
+            
+            # Start application
+            await application.start()
+            logger.info("Telegram bot started")
+            
+            # Start polling in the background
+            asyncio.create_task(application.updater.start_polling())
+            
+            # Start balance monitor (shares the Helius client with the bot)
+            monitor = BalanceMonitor(db, application, helius)
+            await monitor.start()
+            
             # Run sync loop
             await monitor.sync_loop()
         except KeyboardInterrupt:
             logger.info("Received shutdown signal")
         finally:
-            # Cleanup
-            monitor.stop()
-            await application.stop()
+            # Cleanup (also runs when startup fails part way)
+            if monitor:
+                monitor.stop()
+                await monitor.close()
+            if application.running:
+                await application.stop()
             await application.shutdown()
+            await helius.close()
             await db.close()
             logger.info("Application shutdown complete")
             
@@ -205,4 +246,10 @@ async def main():
 
 
 if __name__ == "__main__":
+    # libuv-based event loop for faster network I/O (not available on Windows)
+    try:
+        import uvloop
+        uvloop.install()
+    except ImportError:
+        logger.info("uvloop not available, using default asyncio event loop")
     asyncio.run(main())
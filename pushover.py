@@ -1,7 +1,8 @@
 """Pushover integration for sending push notifications."""
+import asyncio
 import httpx
 import logging
-from typing import List
+from typing import List, Optional
 from config import Config
 
 logger = logging.getLogger(__name__)
@@ -15,6 +16,22 @@ class PushoverClient:
     def __init__(self):
         """Initialize Pushover client."""
         self.app_token = Config.PUSHOVER_APP_TOKEN
+        self.client: Optional[httpx.AsyncClient] = None
+    
+    async def connect(self):
+        """Open the HTTP client. The connection pool is kept for the client's lifetime."""
+        # HTTP/2 lets concurrent alerts share one connection
+        self.client = httpx.AsyncClient(
+            http2=True,
+            timeout=10.0,
+            limits=httpx.Limits(max_keepalive_connections=32, max_connections=64),
+        )
+    
+    async def close(self):
+        """Close the HTTP client."""
+        if self.client:
+            await self.client.aclose()
+            self.client = None
     
     async def send_alert(self, user_keys: List[str], title: str, message: str, priority: int = 1):
         """
@@ -26,27 +43,48 @@ class PushoverClient:
             message: Notification message
             priority: Priority level (-2 to 2, default 1 for high priority)
         """
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            for user_key in user_keys:
-                try:
-                    payload = {
-                        "token": self.app_token,
-                        "user": user_key,
-                        "title": title,
-                        "message": message,
-                        "priority": priority,
-                    }
-                    
-                    response = await client.post(self.PUSHOVER_API_URL, data=payload)
-                    response.raise_for_status()
-                    
-                    result = response.json()
-                    if result.get("status") != 1:
-                        logger.error(f"Pushover error for user {user_key}: {result}")
-                    else:
-                        logger.info(f"Pushover alert sent to user {user_key}")
-                        
-                except httpx.HTTPError as e:
-                    logger.error(f"HTTP error sending Pushover to {user_key}: {e}")
-                except Exception as e:
-                    logger.error(f"Unexpected error sending Pushover to {user_key}: {e}")
+        if not self.client:
+            raise RuntimeError("Client not initialized. Call connect() first.")
+        
+        # Deliveries are independent, so send them concurrently
+        await asyncio.gather(
+            *(self._send_one(user_key, title, message, priority) for user_key in user_keys),
+            return_exceptions=True
+        )
+    
+    async def _send_one(self, user_key: str, title: str, message: str, priority: int):
+        """
+        Send a Pushover alert to a single user, logging any failure.
+        
+        Args:
+            user_key: Pushover user key
+            title: Notification title
+            message: Notification message
+            priority: Priority level (-2 to 2)
+        """
+        try:
+            payload = {
+                "token": self.app_token,
+                "user": user_key,
+                "title": title,
+                "message": message,
+                "priority": priority,
+            }
+            
+            response = await self.client.post(self.PUSHOVER_API_URL, data=payload)
+            logger.debug("Pushover response over %s", response.http_version)
+            
+            if response.status_code >= 400:
+                logger.error(f"HTTP {response.status_code} sending Pushover to {user_key}: {response.text}")
+                return
+            
+            result = response.json()
+            if result.get("status") != 1:
+                logger.error(f"Pushover error for user {user_key}: {result}")
+            else:
+                logger.info(f"Pushover alert sent to user {user_key}")
+                
+        except httpx.TransportError as e:
+            logger.error(f"Transport error sending Pushover to {user_key}: {e}")
+        except Exception as e:
+            logger.error(f"Unexpected error sending Pushover to {user_key}: {e}")